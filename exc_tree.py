@@ -11,42 +11,92 @@ Python module or package, then display their inheritance tree.
 
 from __future__ import annotations
 import argparse
-import inspect
+import builtins
 import importlib
-import pkgutil
+import io
+import os
 import sys
+from bisect import insort
+from functools import lru_cache
+from types import ModuleType
 from typing import Optional, TypeAlias
 
 ExcSet: TypeAlias = set[type[Exception]]
 ExcChildMap: TypeAlias = dict[type[Exception], list[type[Exception]]]
+ExcNameMap: TypeAlias = dict[type[Exception], str]
+ExcMroMap: TypeAlias = dict[type[Exception], tuple[type[Exception], ...]]
+_StackEntry: TypeAlias = tuple[int, str, bool, bool]
+
+# builtin exceptions make up most of a tree's upper levels
+_BUILTIN_NAMES: dict[type, str] = {
+    v: v.__name__ for v in vars(builtins).values() if isinstance(v, type) and issubclass(v, BaseException)
+}
+
+
+def _safe_import(name: str) -> Optional[ModuleType]:
+    """Import name, returning None if it fails to import."""
+    # the walk and earlier imports load many modules already; a dict hit
+    # skips the finder chain
+    mod = sys.modules.get(name)
+    if mod is not None:
+        return mod
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def _is_test_module(name: str) -> bool:
+    leaf = name.rpartition(".")[2]
+    return leaf in ("test", "tests", "conftest") or leaf.startswith(("test_", "_test"))
+
+
+def _walk_submodules(path: list[str], prefix: str, skip_tests: bool = False) -> list[str]:
+    """
+    Like pkgutil.walk_packages, but returns names only and prunes test
+    modules before anything under them is imported.
+    """
+    import pkgutil
+
+    names = []
+    for _finder, name, ispkg in pkgutil.iter_modules(path, prefix):
+        if skip_tests and _is_test_module(name):
+            continue
+        names.append(name)
+        if not ispkg:
+            continue
+        # packages must be imported to find their submodules
+        pkg = _safe_import(name)
+        subpath = getattr(pkg, "__path__", None)
+        if subpath:
+            names.extend(_walk_submodules(subpath, name + ".", skip_tests))
+    return names
 
 
-def find_exceptions_recursive(root_name: str) -> ExcSet:
+def find_exceptions_recursive(root_name: str, skip_tests: bool = False) -> ExcSet:
     """
     Import root_name, walk its submodules, and return
     a set of all Exception subclasses defined in them.
+    Raises ImportError if root_name itself cannot be imported.
     """
-    try:
-        root = importlib.import_module(root_name)
-    except ImportError as e:
-        print(f"Error: could not import '{root_name}': {e}", file=sys.stderr)
-        sys.exit(10)
+    root = importlib.import_module(root_name)
 
     modules = [(root_name, root)]
     # if it's a package, walk its submodules
     if hasattr(root, "__path__"):
-        for _finder, name, _ispkg in pkgutil.walk_packages(root.__path__, root_name + "."):
-            try:
-                submod = importlib.import_module(name)
+        for name in _walk_submodules(root.__path__, root_name + ".", skip_tests):
+            submod = _safe_import(name)
+            if submod is not None:
                 modules.append((name, submod))
-            except ImportError:
-                # skip modules that fail to import
-                continue
 
     exceptions = set()
     for modname, mod in modules:
-        for _, cls in inspect.getmembers(mod, inspect.isclass):
-            # only include classes actually defined in this module
+        # scan the namespace directly rather than via dir() + getattr()
+        for cls in getattr(mod, "__dict__", {}).values():
+            if not isinstance(cls, type):
+                continue
+            # only include classes actually defined in this module; each module
+            # is scanned once, so this also runs issubclass once per class at most
             if cls.__module__ != modname:
                 continue
             if issubclass(cls, Exception):
@@ -55,31 +105,49 @@ def find_exceptions_recursive(root_name: str) -> ExcSet:
     return exceptions
 
 
+@lru_cache(maxsize=None)
 def get_display_name(cls: type[Exception]) -> str:
     """Pretty-print: builtins drop module, others show full dotted path."""
+    name = _BUILTIN_NAMES.get(cls)
+    if name is not None:
+        return name
     if cls.__module__ == "builtins":
         return cls.__name__
     return f"{cls.__module__}.{cls.__name__}"
 
 
-def _gather_nodes(exc_classes: ExcSet, root: type[Exception]) -> ExcSet:
-    nodes: ExcSet = {root}
-    for cls in exc_classes:
-        for ancestor in cls.__mro__:
-            if ancestor is object:
-                break
-            if not issubclass(ancestor, Exception):
-                continue
-            nodes.add(ancestor)
+def _exc_mro(cls: type[Exception]) -> tuple[type[Exception], ...]:
+    if cls is Exception:
+        return (cls,)
+    mro = cls.__mro__
+    # cls itself is known to be an Exception subclass and nothing past
+    # Exception (BaseException, object) can be, so only the entries in
+    # between need checking; those may still be non-Exception mixins
+    end = mro.index(Exception)
+    return (cls, *(a for a in mro[1:end] if issubclass(a, Exception)), Exception)
+
+
+def _gather_nodes(exc_mros: ExcMroMap, root: type[Exception]) -> ExcSet:
+    nodes: ExcSet = set().union(*exc_mros.values())
+    nodes.add(root)
     return nodes
 
 
-def _build_parent_map(nodes: ExcSet, root: type[Exception]) -> dict[type[Exception], type[Exception]]:
+def _build_parent_map(nodes: ExcSet, root: type[Exception], exc_mros: ExcMroMap) -> dict[type[Exception], type[Exception]]:
     parent_map: dict[type[Exception], type[Exception]] = {}
     for cls in nodes:
         if cls is root:
             continue
-        for anc in cls.__mro__[1:]:
+        # single inheritance: the only base is the next MRO entry
+        bases = cls.__bases__
+        if len(bases) == 1 and bases[0] in nodes:
+            parent_map[cls] = bases[0]
+            continue
+        mro = exc_mros.get(cls)
+        if mro is None:
+            # ancestor discovered while gathering nodes
+            mro = exc_mros[cls] = _exc_mro(cls)
+        for anc in mro[1:]:
             if anc in nodes:
                 parent_map[cls] = anc
                 break
@@ -93,69 +161,129 @@ def _invert_parent_map(parent_map: dict[type[Exception], type[Exception]]) -> Ex
     return children
 
 
-def _sort_children(children: ExcChildMap) -> None:
+def _sort_children(children: ExcChildMap, display_lower: ExcNameMap) -> None:
+    # list.sort computes each key once up front, so this is already a
+    # decorate-sort-undecorate; an explicit (key, cls) list would also
+    # fall back to comparing classes on case-insensitive name ties
     for lst in children.values():
-        lst.sort(key=lambda c: get_display_name(c).lower())
+        lst.sort(key=display_lower.__getitem__)
 
 
 def _detect_multi_parents(nodes: ExcSet) -> ExcSet:
-    return {cls for cls in nodes if cls is not Exception and len([b for b in cls.__bases__ if b in nodes]) > 1}
-
-
-def _duplicate_multi_parents(children: ExcChildMap, multi_parents: ExcSet, nodes: ExcSet) -> None:
+    multi_parents: ExcSet = set()
+    for cls in nodes:
+        bases = cls.__bases__
+        # single inheritance is the common case and can never qualify
+        if cls is Exception or len(bases) < 2:
+            continue
+        count = 0
+        for b in bases:
+            if b in nodes:
+                count += 1
+                if count > 1:
+                    multi_parents.add(cls)
+                    break
+    return multi_parents
+
+
+def _duplicate_multi_parents(
+    children: ExcChildMap, multi_parents: ExcSet, nodes: ExcSet, display_lower: ExcNameMap
+) -> None:
     for cls in multi_parents:
         direct_parents = [b for b in cls.__bases__ if b in nodes]
         for base in direct_parents:
             if cls not in children.get(base, []):
-                children.setdefault(base, []).append(cls)
+                # lists are already sorted; insert in place instead of re-sorting
+                insort(children.setdefault(base, []), cls, key=display_lower.__getitem__)
 
 
-def build_inheritance_tree(exc_classes: ExcSet, all_paths: bool = False) -> tuple[type[Exception], ExcChildMap, ExcSet]:
+def build_inheritance_tree(
+    exc_classes: ExcSet, all_paths: bool = False
+) -> tuple[type[Exception], ExcChildMap, ExcSet, ExcNameMap]:
     """
     Given a set of exception classes, build a map of parent → [children]
-    that spans from Exception down through all their ancestors.
+    that spans from Exception down through all their ancestors. Also
+    returns the multi-parent classes and the display name of every node.
     """
     root = Exception
 
-    nodes = _gather_nodes(exc_classes, root)
-    parent_map = _build_parent_map(nodes, root)
+    exc_mros: ExcMroMap = {cls: _exc_mro(cls) for cls in exc_classes}
+    nodes = _gather_nodes(exc_mros, root)
+    parent_map = _build_parent_map(nodes, root, exc_mros)
     children = _invert_parent_map(parent_map)
 
-    _sort_children(children)
+    display: ExcNameMap = {cls: get_display_name(cls) for cls in nodes}
+    display_lower: ExcNameMap = {cls: name.lower() for cls, name in display.items()}
+
+    _sort_children(children, display_lower)
     multi_parents = _detect_multi_parents(nodes)
 
     if all_paths:
-        _duplicate_multi_parents(children, multi_parents, nodes)
-        _sort_children(children)
+        _duplicate_multi_parents(children, multi_parents, nodes, display_lower)
 
-    return root, children, multi_parents
+    return root, children, multi_parents, display
 
 
-def _print_subtree(
-    node: type[Exception],
-    children_map: ExcChildMap,
-    indent: str = "",
+def _flatten_children(root: type[Exception], children_map: ExcChildMap) -> tuple[list[type[Exception]], list[int], list[int]]:
+    """
+    Lay the tree out CSR-style: nodes are numbered from 0 (the root), and
+    node i's children are children_flat[children_starts[i]:children_starts[i + 1]].
+    """
+    order = [root]
+    index = {root: 0}
+    for parent, kids in children_map.items():
+        for cls in (parent, *kids):
+            if cls not in index:
+                index[cls] = len(order)
+                order.append(cls)
+    children_starts = [0]
+    children_flat: list[int] = []
+    for cls in order:
+        children_flat.extend(index[c] for c in children_map.get(cls, ()))
+        children_starts.append(len(children_flat))
+    return order, children_starts, children_flat
+
+
+def _format_subtree(
+    stack: list[_StackEntry],
+    labels: list[str],
+    children_starts: list[int],
+    children_flat: list[int],
+    has_children: list[bool],
+    out: io.StringIO,
     compact: bool = False,
-    multi_parents: Optional[ExcSet] = None,
 ) -> None:
-    """Helper: print all descendants of node under the current indent."""
-    if multi_parents is None:
-        multi_parents = set()
-    kids = children_map.get(node, [])
-    for idx, child in enumerate(kids):
-        # if previous sibling had children, insert a blank line at this indent
-        if not compact and idx > 0:
-            prev = kids[idx - 1]
-            if children_map.get(prev):
-                print(indent + "|")
-        last = idx == len(kids) - 1
+    """
+    Helper: write a line to out for every node on the stack and all of its
+    descendants. Each entry is (node index, indent, is_last_sibling,
+    blank_line_before).
+    """
+    # siblings at the same depth share indents, so build each derived
+    # prefix once per call and reuse the same string object
+    indent_cache: dict[tuple[str, bool], str] = {}
+    gap_cache: dict[str, str] = {}
+    while stack:
+        node, indent, last, gap = stack.pop()
+        if gap:
+            gap_line = gap_cache.get(indent)
+            if gap_line is None:
+                gap_line = gap_cache[indent] = indent + "|"
+            out.write(gap_line)
+            out.write("\n")
         branch = "└── " if last else "├── "
-        suffix = " *" if child in multi_parents else ""
-        print(indent + branch + get_display_name(child) + suffix)
-        # recurse into children
-        if children_map.get(child):
-            new_indent = indent + ("    " if last else "│   ")
-            _print_subtree(child, children_map, new_indent, compact, multi_parents)
+        out.write(indent + branch + labels[node])
+        out.write("\n")
+        start, end = children_starts[node], children_starts[node + 1]
+        if start == end:
+            continue
+        new_indent = indent_cache.get((indent, last))
+        if new_indent is None:
+            new_indent = indent_cache[indent, last] = sys.intern(indent + ("    " if last else "│   "))
+        # push in reverse so children pop in their original order; if the
+        # previous sibling had children, insert a blank line at this indent
+        for pos in range(end - 1, start - 1, -1):
+            gap = not compact and pos > start and has_children[children_flat[pos - 1]]
+            stack.append((children_flat[pos], new_indent, pos == end - 1, gap))
 
 
 def print_tree(
@@ -163,24 +291,31 @@ def print_tree(
     children_map: ExcChildMap,
     multi_parents: ExcSet,
     compact: bool = False,
+    display: Optional[ExcNameMap] = None,
 ) -> None:
-    """Print the full tree, starting with Exception."""
-    # Print the root exception
-    print(get_display_name(root))
-    # Iterate over first-level children
-    children = children_map.get(root, [])
-    for idx, child in enumerate(children):
-        # blank line before each root child if not in compact mode
-        if not compact:
-            print("|")
-        # branch character
-        last = idx == len(children) - 1
-        branch = "└── " if last else "├── "
-        suffix = " *" if child in multi_parents else ""
-        print(branch + get_display_name(child) + suffix)
-        # prepare indent for subtree
-        new_indent = "" + ("    " if last else "│   ")
-        _print_subtree(child, children_map, new_indent, compact, multi_parents)
+    """
+    Print the full tree, starting with Exception. display maps classes to
+    their names, as returned by build_inheritance_tree.
+    """
+    order, children_starts, children_flat = _flatten_children(root, children_map)
+    if display is None:
+        display = {cls: get_display_name(cls) for cls in order}
+    # resolve each node's printed name (and multi-parent marker) up front
+    labels = [display[cls] + (" *" if cls in multi_parents else "") for cls in order]
+    has_children = [children_starts[i + 1] > children_starts[i] for i in range(len(order))]
+    # Start with the root exception
+    out = io.StringIO()
+    out.write(display[root])
+    out.write("\n")
+    # Seed the stack with first-level children, each preceded by a blank
+    # line if not in compact mode
+    start, end = children_starts[0], children_starts[1]
+    stack: list[_StackEntry] = [
+        (children_flat[pos], "", pos == end - 1, not compact) for pos in range(end - 1, start - 1, -1)
+    ]
+    _format_subtree(stack, labels, children_starts, children_flat, has_children, out, compact)
+    # Emit the whole tree in one write rather than a print() per node
+    sys.stdout.write(out.getvalue())
 
 
 def main() -> None:
@@ -207,16 +342,30 @@ def main() -> None:
         dest="compact",
         help="Use compact output (no extra blank lines)",
     )
+    p.add_argument(
+        "-s",
+        "--skip-tests",
+        action="store_true",
+        dest="skip_tests",
+        help="Skip test modules and packages (test, tests, test_*, _test*, conftest)",
+    )
 
     args = p.parse_args()
 
-    excs = find_exceptions_recursive(args.module)
+    try:
+        excs = find_exceptions_recursive(args.module, skip_tests=args.skip_tests)
+    except ImportError as e:
+        print(f"Error: could not import '{args.module}': {e}", file=sys.stderr)
+        # nothing to clean up, so skip finalizing whatever the failed
+        # import left behind in sys.modules
+        sys.stderr.flush()
+        os._exit(10)
     if not excs:
         print(f"No Exception subclasses found in '{args.module}'.", file=sys.stderr)
         sys.exit(1)
 
-    root, child_map, multi_parents = build_inheritance_tree(excs, all_paths=args.all_paths)
-    print_tree(root, child_map, multi_parents, compact=args.compact)
+    root, child_map, multi_parents, display = build_inheritance_tree(excs, all_paths=args.all_paths)
+    print_tree(root, child_map, multi_parents, compact=args.compact, display=display)
 
 
 if __name__ == "__main__":